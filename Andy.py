@@ -1,7 +1,10 @@
 import sys
 import os
 import sqlite3
+import json
+import hashlib
 import webbrowser
+from collections import OrderedDict
 from PySide6.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -27,6 +30,8 @@ from PySide6.QtCore import (
     QStringListModel,
 )
 from CustomWindow import CustomWindow
+from LibraryWatcher import LibraryWatcher
+from QueryCache import QueryCache
 
 
 class ToolTipListView(QListView):
@@ -90,11 +95,32 @@ class MainWindow(QMainWindow):
         self.W_ITEM = 230
         self.W_BASE = 315
         self.books = False
+        self.covers_dir = "Anderson eBooks\\Covers"
+        self.pdf_dir = "Anderson eBooks"
+        self.db_path = "Assets/my_library.db"
+        self.session_path = "Assets/session.json"
+        self.thumbs_dir = "Assets/thumbnails"
+        self.restore_scroll = 0
+
+        # Recently used scaled cover pixmaps by title (about 57 KB each), and
+        # the labels currently showing them
+        self.thumbnails = OrderedDict()
+        self.max_thumbnails = 256
+        self.image_labels = {}
+
+        # Tiles in the grid by book id, reused across reloads
+        self.tiles = {}
 
         # Connect to the database
-        self.conn = sqlite3.connect("Assets/my_library.db")
+        self.conn = sqlite3.connect(self.db_path)
         self.c = self.conn.cursor()
 
+        # Searches match titles folded the same way as their cache keys
+        self.conn.create_function("normalize", 1, QueryCache.normalize)
+
+        # Recent query results as compact tuples of (id, title) rows
+        self.cache = QueryCache(self.conn, self.db_path)
+
         self.setMouseTracking(True)
 
         # Create the dropdowns and combobox
@@ -202,6 +228,16 @@ class MainWindow(QMainWindow):
         self.timer.timeout.connect(self.checkSize)  # Connect to checkSize method
         self.timer.start(100)  # Call checkSize every 2 seconds
 
+        # Refresh only what changed when covers, PDFs or the database change
+        self.watcher = LibraryWatcher(self.covers_dir, self.pdf_dir, self.db_path, self)
+        self.watcher.cover_changed.connect(self.refresh_cover)
+        self.watcher.pdf_changed.connect(self.refresh_pdf)
+        self.watcher.database_changed.connect(self.refresh_catalog)
+
+        # Show the last view straight away, then check it against the database
+        if self.restore_session():
+            QTimer.singleShot(0, self.refresh_catalog)
+
     def reset(self, box, index):
         placeholder = self.placeholders[index]
         box.blockSignals(True)
@@ -210,41 +246,114 @@ class MainWindow(QMainWindow):
         box.setCurrentIndex(0)
         box.blockSignals(False)
 
-    def load_data(self):
-        # Clear displayed widgets
-        for i in reversed(range(self.grid_layout.count())):
-            widget_to_remove = self.grid_layout.itemAt(i).widget()
-            if widget_to_remove is not None:
-                self.grid_layout.removeWidget(widget_to_remove)  # remove from layout
-                widget_to_remove.setParent(None)  # remove from gui
-
-        # Display selected widgets
-        for i, (title,) in enumerate(self.books):
-            image_path = os.path.join("Anderson eBooks\\Covers", title + ".png")
-            item_widget = HoverHighlightWidget(self)
-
-            item_widget.description = title
-            item_layout = QHBoxLayout(item_widget)
-            item_layout.setContentsMargins(3, 3, 5, 5)  # Remove space around the layout
-
-            image_label = QLabel()
-            pixmap = QPixmap(image_path)
-            if pixmap.isNull():
-                image_label.setText("Failed to load image")
-            else:
+    def refill(self, box, index, values, current):
+        # Replace the items of a box, keeping its selection if still present
+        if [box.itemText(i) for i in range(1, box.count())] == list(values):
+            box.blockSignals(True)
+            box.setCurrentIndex(max(box.findText(current), 0))
+            box.blockSignals(False)
+            return
+        self.reset(box, index)
+        box.blockSignals(True)
+        for value in values:
+            box.addItem(value)
+            box.setItemData(box.count() - 1, value, Qt.ToolTipRole)
+        box.setCurrentIndex(max(box.findText(current), 0))
+        box.blockSignals(False)
+
+    def thumbnail(self, title):
+        pixmap = self.thumbnails.get(title)
+        if pixmap is not None:
+            self.thumbnails.move_to_end(title)
+            return pixmap
+        # Prefer the scaled copy saved with the last session
+        thumb_path = self.thumb_path(title)
+        pixmap = QPixmap(thumb_path) if thumb_path else QPixmap()
+        if pixmap.isNull():
+            pixmap = QPixmap(os.path.join(self.covers_dir, title + ".png"))
+            if not pixmap.isNull():
                 pixmap = pixmap.scaled(175 * 0.60, 225 * 0.60, Qt.KeepAspectRatio)
-                image_label.setPixmap(pixmap)
-            item_layout.addWidget(image_label)
+        self.thumbnails[title] = pixmap
+        while len(self.thumbnails) > self.max_thumbnails:
+            self.thumbnails.popitem(last=False)
+        return pixmap
+
+    def thumb_path(self, title):
+        # Keyed by title and cover mtime, so a replaced cover is a miss
+        try:
+            mtime = os.stat(os.path.join(self.covers_dir, title + ".png")).st_mtime_ns
+        except OSError:
+            return None
+        key = hashlib.sha1(f"{title}|{mtime}".encode("utf-8")).hexdigest()
+        return os.path.join(self.thumbs_dir, key + ".png")
+
+    def save_thumbnails(self):
+        # Keep scaled covers for the tiles on screen, drop everything else
+        keep = set()
+        try:
+            os.makedirs(self.thumbs_dir, exist_ok=True)
+            for tile in self.tiles.values():
+                thumb_path = self.thumb_path(tile.description)
+                pixmap = tile.image_label.pixmap()
+                if thumb_path is None or pixmap is None or pixmap.isNull():
+                    continue
+                keep.add(os.path.basename(thumb_path))
+                if not os.path.exists(thumb_path):
+                    pixmap.save(thumb_path, "PNG")
+            for name in os.listdir(self.thumbs_dir):
+                if name not in keep:
+                    os.remove(os.path.join(self.thumbs_dir, name))
+        except OSError:
+            pass
+
+    def set_cover(self, image_label, title):
+        pixmap = self.thumbnail(title)
+        if pixmap.isNull():
+            image_label.clear()
+            image_label.setText("Failed to load image")
+        else:
+            image_label.setPixmap(pixmap)
+
+    def make_tile(self, title):
+        item_widget = HoverHighlightWidget(self)
+
+        item_widget.description = title
+        item_layout = QHBoxLayout(item_widget)
+        item_layout.setContentsMargins(3, 3, 5, 5)  # Remove space around the layout
+
+        image_label = QLabel()
+        self.set_cover(image_label, title)
+        item_widget.image_label = image_label
+        item_layout.addWidget(image_label)
+
+        description_label = QLabel(title)
+        font = QFont("Arial", 11)
+        description_label.setFont(font)
+        description_label.setWordWrap(True)
+        description_label.setFixedSize(175 * 0.60, 225 * 0.60)  # Fixed size desc
+        item_layout.addWidget(description_label)
+        return item_widget
 
-            description_label = QLabel(title)
-            font = QFont("Arial", 11)
-            description_label.setFont(font)
-            description_label.setWordWrap(True)
-            description_label.setFixedSize(175 * 0.60, 225 * 0.60)  # Fixed size desc
-            item_layout.addWidget(description_label)
+    def load_data(self):
+        # Take everything out of the layout, keeping tiles that are still shown
+        for i in reversed(range(self.grid_layout.count())):
+            self.grid_layout.takeAt(i)
+        wanted = dict(self.books or [])
+        for book_id in list(self.tiles):
+            if wanted.get(book_id) != self.tiles[book_id].description:
+                self.tiles.pop(book_id).setParent(None)  # remove from gui
+
+        # Display selected widgets, creating only the tiles that are new
+        for i, (book_id, title) in enumerate(self.books or []):
+            item_widget = self.tiles.get(book_id)
+            if item_widget is None:
+                item_widget = self.tiles[book_id] = self.make_tile(title)
 
             cols = self.C_NOW
             self.grid_layout.addWidget(item_widget, i // cols, i % cols)
+        self.image_labels = {
+            tile.description: tile.image_label for tile in self.tiles.values()
+        }
 
         # Add spacers to push all widgets to the top left
         if self.books:
@@ -267,37 +376,69 @@ class MainWindow(QMainWindow):
             self.box1_values.append(category[0])
         return self.box1_values
 
+    def query_subjects(self, category):
+        key = ("subjects", category)
+        subjects = self.cache.get(key)
+        if subjects is None:
+            self.c.execute(
+                "SELECT DISTINCT subject FROM subjects WHERE category_id = (SELECT id FROM categories WHERE category = ?)",
+                (category,),
+            )
+            subjects = tuple(subject for (subject,) in self.c.fetchall())
+            self.cache.put(key, subjects)
+        return [(subject,) for subject in subjects]
+
+    def query_books(self, subject):
+        params = (subject,) if isinstance(subject, str) else tuple(subject)
+        return self.cached_books(
+            ("books",) + params,
+            "SELECT id, title FROM books WHERE subject_id = (SELECT id FROM subjects WHERE subject = ?)",
+            params,
+        )
+
+    def query_search(self, search_term):
+        search_term = QueryCache.normalize(search_term)
+        return self.cached_books(
+            ("search", search_term),
+            "SELECT id, title FROM books WHERE normalize(title) LIKE ? ORDER BY title COLLATE NOCASE",
+            ("%" + search_term + "%",),
+        )
+
+    def cached_books(self, key, sql, params):
+        books = self.cache.get(key)
+        if books is None:
+            self.c.execute(sql, params)
+            books = tuple(self.c.fetchall())
+            self.cache.put(key, books)
+        return list(books)
+
     def box1_callback(self, choice):
+        self.end_scroll_restore()
         self.reset(self.box2, 1)
         self.reset(self.box3, 2)
         self.line_edit.clear()
         self.line_edit.setText("Type Something Here")
 
         # Fetch the subjects for category and populate box2
-        self.c.execute(
-            "SELECT DISTINCT subject FROM subjects WHERE category_id = (SELECT id FROM categories WHERE category = ?)",
-            (choice,),
-        )
-        subjects = self.c.fetchall()
+        subjects = self.query_subjects(choice)
         self.box2.blockSignals(True)
         for subject in subjects:
             self.box2.addItem(subject[0])
         self.box2.blockSignals(False)
+        window.get_status_bar().showMessage(self.cache.stats())
 
     def box2_callback(self, choice):
+        self.end_scroll_restore()
         self.reset(self.box3, 2)
         self.line_edit.clear()
         self.line_edit.setText("Type Something Here")
         # Fetch the books for subject and populate box3
-        self.c.execute(
-            "SELECT title FROM books WHERE subject_id = (SELECT id FROM subjects WHERE subject = ?)",
-            (choice,) if isinstance(choice, str) else choice,
-        )
-        self.books = self.c.fetchall()
+        self.books = self.query_books(choice)
         self.box3.blockSignals(True)
         for book in self.books:
-            self.box3.addItem(book[0])
+            self.box3.addItem(book[1])
         self.box3.blockSignals(False)
+        window.get_status_bar().showMessage(self.cache.stats())
         self.load_data()
 
     def box3_callback(self, choice):  # New method
@@ -310,8 +451,8 @@ class MainWindow(QMainWindow):
 
     def getPDF(self, BookName):
         if BookName:
-            image_path = os.path.join("Anderson eBooks\\Covers", BookName + ".png")
-            pdf_path = os.path.join("Anderson eBooks", BookName + ".pdf")
+            image_path = os.path.join(self.covers_dir, BookName + ".png")
+            pdf_path = os.path.join(self.pdf_dir, BookName + ".pdf")
 
             msgBox = QMessageBox()
             msgBox.setWindowTitle("Selected Book")
@@ -344,16 +485,163 @@ class MainWindow(QMainWindow):
             self.model.setStringList([])
             return
 
+        # Setting the placeholder text is not a search
+        if search_term == self.placeholders[3]:
+            return
+        self.end_scroll_restore()
+
         # Only load data if the length of search_term is greater than 1
-        if len(search_term) > 1:
-            self.c.execute(
-                "SELECT title FROM books WHERE title LIKE ? ORDER BY title COLLATE NOCASE",
-                ("%" + search_term + "%",),
-            )
-            self.books = self.c.fetchall()
-            self.model.setStringList([title[0] for title in self.books])
+        if len(QueryCache.normalize(search_term)) > 1:
+            self.books = self.query_search(search_term)
+            self.model.setStringList([title for _, title in self.books])
+            window.get_status_bar().showMessage(self.cache.stats())
             self.load_data()
 
+    def refresh_cover(self, title):
+        # Drop the stale thumbnail and redraw only the tile showing it
+        self.thumbnails.pop(title, None)
+        image_label = self.image_labels.get(title)
+        if image_label is not None:
+            self.set_cover(image_label, title)
+
+    def refresh_pdf(self, title):
+        if title in self.image_labels:
+            window.get_status_bar().showMessage(f"Updated: {title}")
+
+    def searching(self):
+        # True when the grid shows search results rather than a subject
+        search_term = self.line_edit.text()
+        return (
+            search_term != self.placeholders[3]
+            and len(QueryCache.normalize(search_term)) > 1
+        )
+
+    def refresh_catalog(self):
+        category = self.box1.currentText()
+        subject = self.box2.currentText()
+        search_term = self.line_edit.text()
+        subject_mode = self.box2.currentIndex() > 0
+        search_mode = not subject_mode and self.searching()
+
+        # Refresh the dropdowns in place, keeping the current selections
+        self.box1_values = self.populate_box1()
+        self.refill(self.box1, 0, self.box1_values, category)
+        if self.box1.currentIndex() > 0:
+            subjects = [row[0] for row in self.query_subjects(category)]
+            self.refill(self.box2, 1, subjects, subject)
+        else:
+            self.refill(self.box2, 1, [], "")
+
+        # Re-run the visible query; load_data only touches tiles that differ
+        if subject_mode:
+            if self.box2.currentIndex() > 0:
+                books = self.query_books(subject)
+            else:
+                books = []
+        elif search_mode:
+            books = self.query_search(search_term)
+        else:
+            return
+        if books == self.books:
+            return
+        self.books = books
+        if subject_mode:
+            self.refill(self.box3, 2, [title for _, title in books], "")
+        else:
+            self.model.setStringList([title for _, title in books])
+        self.load_data()
+
+    def save_session(self):
+        search_term = self.line_edit.text()
+        subject_mode = self.box2.currentIndex() > 0
+        search_mode = not subject_mode and self.searching()
+        session = {
+            "category": self.box1.currentText() if self.box1.currentIndex() else "",
+            "subjects": [self.box2.itemText(i) for i in range(1, self.box2.count())],
+            "subject": self.box2.currentText() if subject_mode else "",
+            "search": search_term if search_mode else "",
+            "books": list(self.books) if self.books else [],
+            "scroll": self.scroll_area.verticalScrollBar().value(),
+            "columns": self.C_NOW,
+        }
+        try:
+            with open(self.session_path, "w", encoding="utf-8") as f:
+                json.dump(session, f)
+        except OSError:
+            pass
+        self.save_thumbnails()
+
+    def restore_session(self):
+        try:
+            with open(self.session_path, encoding="utf-8") as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if not isinstance(session, dict):
+            return False
+
+        # Check the snapshot's shape so a bad file falls back to placeholders
+        category = session.get("category", "")
+        subjects = session.get("subjects", [])
+        subject = session.get("subject", "")
+        search_term = session.get("search", "")
+        scroll = session.get("scroll", 0)
+        columns = session.get("columns", 1)
+        try:
+            books = [(book_id, title) for book_id, title in session.get("books", [])]
+        except (TypeError, ValueError):
+            return False
+        if not (
+            all(isinstance(value, str) for value in (category, subject, search_term))
+            and isinstance(subjects, list)
+            and all(isinstance(value, str) for value in subjects)
+            and all(
+                isinstance(book_id, int) and isinstance(title, str)
+                for book_id, title in books
+            )
+            and isinstance(scroll, int)
+            and isinstance(columns, int)
+        ):
+            return False
+        if category and self.box1.findText(category) < 1:
+            return False
+
+        # Rebuild the view from the snapshot alone, no queries run here
+        self.refill(self.box1, 0, self.box1_values, category)
+        self.refill(self.box2, 1, subjects, subject)
+        self.books = books
+        titles = [title for _, title in self.books]
+        if subject:
+            self.refill(self.box3, 2, titles, "")
+        elif search_term:
+            self.line_edit.blockSignals(True)
+            self.line_edit.setText(search_term)
+            self.line_edit.blockSignals(False)
+            self.model.setStringList(titles)
+        else:
+            return True
+        self.C_NOW = self.C_WAS = max(columns, 1)
+        self.load_data()
+
+        # The grid only reaches its final height after the window is shown
+        if scroll > 0:
+            self.restore_scroll = scroll
+            bar = self.scroll_area.verticalScrollBar()
+            bar.rangeChanged.connect(self.apply_scroll)
+        return True
+
+    def apply_scroll(self, minimum, maximum):
+        # Follow the range as the grid grows, done once it holds the position
+        self.scroll_area.verticalScrollBar().setValue(min(self.restore_scroll, maximum))
+        if maximum >= self.restore_scroll:
+            self.end_scroll_restore()
+
+    def end_scroll_restore(self):
+        if self.restore_scroll:
+            self.restore_scroll = 0
+            bar = self.scroll_area.verticalScrollBar()
+            bar.rangeChanged.disconnect(self.apply_scroll)
+
     def eventFilter(self, source, event):
         if (source is self.line_edit) and (event.type() == QEvent.FocusIn):
             self.box3.clear()
@@ -370,6 +658,11 @@ class MainWindow(QMainWindow):
             self.C_WAS = self.C_NOW
             if self.books:
                 self.load_data()
+        elif self.restore_scroll and self.isVisible():
+            # Layout has settled since the last reload, stop restoring scroll
+            bar = self.scroll_area.verticalScrollBar()
+            bar.setValue(min(self.restore_scroll, bar.maximum()))
+            self.end_scroll_restore()
 
     def resizeEvent(self, event):  # 14	Widget's size changed (QResizeEvent).
         super().resizeEvent(event)
@@ -406,6 +699,7 @@ app.setStyleSheet(
 )
 
 main_window = MainWindow()
+app.aboutToQuit.connect(main_window.save_session)
 window = CustomWindow("Anderson's Library", main_window)
 window.showMaximized()
 sys.exit(app.exec())
@@ -0,0 +1,129 @@
+import os
+from PySide6.QtCore import QObject, QTimer, QFileSystemWatcher, Signal
+
+
+class LibraryWatcher(QObject):
+    # Fine-grained invalidation events, one per affected book title
+    cover_changed = Signal(str)
+    pdf_changed = Signal(str)
+    database_changed = Signal()
+
+    def __init__(
+        self, covers_dir, pdf_dir, db_path, parent=None, poll_ms=5000, slow_ms=30000
+    ):
+        super().__init__(parent)
+        self.covers_dir = covers_dir
+        self.pdf_dir = pdf_dir
+        self.db_path = db_path
+        self.db_dir = os.path.dirname(db_path) or "."
+        self.poll_ms = poll_ms
+        self.slow_ms = slow_ms
+
+        # Last seen (mtime, size) per file, used to work out what changed
+        self.covers = self.scan(self.covers_dir, ".png")
+        self.pdfs = self.scan(self.pdf_dir, ".pdf")
+        self.db_stamp = self.db_stamps()
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.schedule)
+        self.watcher.fileChanged.connect(self.schedule)
+        self.watching = self.add_paths()
+
+        # Directory events arrive in bursts, so collapse them into one rescan
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(250)
+        self.debounce.timeout.connect(self.rescan)
+
+        # Directory watches miss files overwritten in place, so a slow poll
+        # always runs, and a fast one when the platform watcher is unavailable
+        self.poll = QTimer(self)
+        self.poll.timeout.connect(self.rescan)
+        self.update_poll()
+
+    def add_paths(self):
+        # True only when every path is covered by the platform watcher
+        watched = self.watcher.files() + self.watcher.directories()
+
+        # WAL commits only write the -wal file, which comes and goes with the
+        # database directory's listing, so watch it whenever it exists
+        wal_path = self.db_path + "-wal"
+        if wal_path not in watched and os.path.exists(wal_path):
+            self.watcher.addPath(wal_path)
+
+        paths = [
+            path
+            for path in (self.covers_dir, self.pdf_dir, self.db_path, self.db_dir)
+            if path not in watched
+        ]
+        if not paths:
+            return True
+        existing = [path for path in paths if os.path.exists(path)]
+        failed = self.watcher.addPaths(existing) if existing else []
+        return len(existing) == len(paths) and not failed
+
+    def update_poll(self):
+        interval = self.slow_ms if self.watching else self.poll_ms
+        if not self.poll.isActive() or self.poll.interval() != interval:
+            self.poll.start(interval)
+
+    def stamp(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def db_stamps(self):
+        # Writers in WAL mode touch the -wal file long before the main file
+        # is checkpointed
+        return (self.stamp(self.db_path), self.stamp(self.db_path + "-wal"))
+
+    def scan(self, folder, ext):
+        entries = {}
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    name, suffix = os.path.splitext(entry.name)
+                    if suffix.lower() != ext or not entry.is_file():
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries[name] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            pass
+        return entries
+
+    def diff(self, old, new):
+        return [
+            name for name in old.keys() | new.keys() if old.get(name) != new.get(name)
+        ]
+
+    def schedule(self, path):
+        self.debounce.start()
+
+    def rescan(self):
+        covers = self.scan(self.covers_dir, ".png")
+        changed_covers = self.diff(self.covers, covers)
+        self.covers = covers
+
+        pdfs = self.scan(self.pdf_dir, ".pdf")
+        changed_pdfs = self.diff(self.pdfs, pdfs)
+        self.pdfs = pdfs
+
+        db_stamp = self.db_stamps()
+        db_changed = db_stamp != self.db_stamp
+        self.db_stamp = db_stamp
+
+        # Files replaced by rename drop out of the watcher, so re-add them
+        self.watching = self.add_paths()
+        self.update_poll()
+
+        for title in changed_covers:
+            self.cover_changed.emit(title)
+        for title in changed_pdfs:
+            self.pdf_changed.emit(title)
+        if db_changed:
+            self.database_changed.emit()
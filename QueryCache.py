@@ -0,0 +1,84 @@
+import os
+import sys
+from collections import OrderedDict
+
+
+class QueryCache:
+    def __init__(self, conn, db_path, max_entries=256, max_bytes=1024 * 1024):
+        self.conn = conn
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        # LRU of key -> (value, approximate size in bytes)
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.version = self.db_version()
+
+    @staticmethod
+    def normalize(text):
+        # Fold case and runs of whitespace so equivalent searches share a key
+        return " ".join(text.split()).casefold()
+
+    def db_version(self):
+        # data_version moves on commits from other connections, the mtime
+        # catches the file being replaced outright
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        try:
+            mtime = os.stat(self.db_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        return (data_version, mtime)
+
+    def validate(self):
+        version = self.db_version()
+        if version != self.version:
+            self.version = version
+            self.clear()
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def sizeof(self, key, value):
+        # Entries are flat tuples, or tuples of (id, title) rows
+        size = sys.getsizeof(key) + sum(sys.getsizeof(part) for part in key)
+        size += sys.getsizeof(value)
+        for item in value:
+            size += sys.getsizeof(item)
+            if isinstance(item, tuple):
+                size += sum(sys.getsizeof(part) for part in item)
+        return size
+
+    def get(self, key):
+        self.validate()
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value):
+        size = self.sizeof(key, value)
+        if size > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.bytes -= evicted
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        rate = 100 * self.hits / lookups if lookups else 0
+        return (
+            f"Cache: {rate:.0f}% hits ({self.hits}/{lookups})  "
+            f"{len(self.entries)} entries  {self.bytes // 1024} KB"
+        )